@@ -0,0 +1,88 @@
+"""
+Benchmark payload size and encoding CPU of the customer list per format.
+
+    python benchmarks/payloads.py [--customers N] [--runs N]
+
+Renders a list shaped like the CustomerSerializer output with each renderer
+offered by CustomerViewSet, then compresses it with each available content
+coding, reporting bytes on the wire and the median time to produce them.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm_api.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from customers.compression import CODECS  # noqa: E402
+from customers.renderers import (  # noqa: E402
+    ColumnarJSONRenderer,
+    MessagePackRenderer,
+    msgpack,
+)
+
+
+def make_customers(count):
+    created = datetime(2024, 8, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": i,
+            "name": f"Name{i}",
+            "surname": f"Surname{i}",
+            "photo": f"http://localhost:8000/customer_photos/photo{i}.png"
+            if i % 3
+            else None,
+            "created_by": i % 7 + 1,
+            "modified_by": i % 5 + 1,
+            "created_at": (created + timedelta(minutes=i)).isoformat(),
+            "updated_at": (created + timedelta(minutes=2 * i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def timed(func, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return result, statistics.median(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_customers(args.customers)
+    renderers = [JSONRenderer(), ColumnarJSONRenderer()]
+    if msgpack is not None:
+        renderers.append(MessagePackRenderer())
+
+    print(f"{args.customers} customers, median of {args.runs} runs")
+    print(f"{'format':<12}{'coding':<10}{'bytes':>10}{'encode (ms)':>14}")
+    for renderer in renderers:
+        body, render_ms = timed(lambda: renderer.render(data), args.runs)
+        print(f"{renderer.format:<12}{'identity':<10}{len(body):>10}{render_ms:>14.2f}")
+        for coding, codec in CODECS.items():
+            compressed, compress_ms = timed(lambda: codec.compress(body), args.runs)
+            total_ms = render_ms + compress_ms
+            print(f"{'':<12}{coding:<10}{len(compressed):>10}{total_ms:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark worker cold start time and memory for each settings profile.
+
+    python benchmarks/startup.py [--runs N] [profile ...]
+
+Every run starts a fresh interpreter that sets up Django and loads the URLconf,
+i.e. everything a worker imports before it can serve its first request, and
+reports the elapsed time, the peak RSS and the number of imported modules.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PROFILES = ["crm_api.settings", "crm_api.settings_api"]
+
+PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().reverse_dict
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, rss, len(sys.modules))
+"""
+
+
+def measure(profile):
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": profile}
+    env.setdefault("SECRET_KEY", "benchmark")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    elapsed, rss, modules = output.split()
+    return float(elapsed), int(rss), int(modules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("profiles", nargs="*", default=PROFILES)
+    args = parser.parse_args()
+
+    print(f"{'profile':<24}{'startup (ms)':>14}{'peak RSS (MiB)':>16}{'modules':>10}")
+    for profile in args.profiles:
+        runs = [measure(profile) for _ in range(args.runs)]
+        elapsed = statistics.median(run[0] for run in runs) * 1000
+        # ru_maxrss is reported in KiB on Linux.
+        rss = statistics.median(run[1] for run in runs) / 1024
+        modules = runs[-1][2]
+        print(f"{profile:<24}{elapsed:>14.1f}{rss:>16.1f}{modules:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -59,6 +59,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "customers.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -67,6 +68,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
+    "customers.middleware.RateLimitHeadersMiddleware",
 ]
 
 ROOT_URLCONF = "crm_api.urls"
@@ -97,10 +99,32 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Wait for locks held by the job workers instead of failing at once
+        "OPTIONS": {"timeout": 20},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# "default" holds the user snapshot versions; "throttle" holds one token bucket
+# per client, route and scope, kept apart so that culling one never empties the
+# other. The local-memory cache is private to each worker process; point these
+# at memcached or redis to share them between workers.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "throttle",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -148,9 +172,52 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "customers.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    "DEFAULT_THROTTLE_CLASSES": ("customers.throttling.TokenBucketThrottle",),
+    "DEFAULT_THROTTLE_RATES": {
+        "read": "1200/min",
+        "write": "300/min",
+        "upload": "60/min",
+    },
+}
+
+# Customer changes are buffered in memory and written to the audit trail in
+# batches by a background thread (see customers/audit.py)
+CUSTOMER_AUDIT = {
+    "ASYNC": True,
+    "BATCH_SIZE": 100,
+    "FLUSH_INTERVAL": 1.0,
+}
+
+# Background jobs, run by `manage.py run_jobs` (see customers/jobs.py)
+JOBS = {
+    "MAX_ATTEMPTS": 5,
+    "RETRY_DELAY": 10,
+    "TIMEOUT": 600,
+    "WORKERS": 4,
+    "POLL_INTERVAL": 1.0,
+}
+
+# Responses to writes sent with an Idempotency-Key header are replayed from the
+# database on retries (see customers/idempotency.py). Delete expired records
+# with: python manage.py purge_idempotency_keys
+IDEMPOTENCY = {
+    "TTL": 24 * 3600,
+    "LOCK_TIMEOUT": 30,
+    "STALE_AFTER": 600,
+}
+
+# Token authentication keeps a per-process snapshot of each token's user (see
+# customers/authentication.py). Snapshots are only used once CACHE is shared
+# between workers (memcached, redis); with the local-memory cache every request
+# loads the user, unless ALLOW_LOCAL_CACHE says a single process serves them.
+USER_SNAPSHOT_CACHE = {
+    "TTL": 60,
+    "MAX_SIZE": 10000,
+    "CACHE": "default",
+    "ALLOW_LOCAL_CACHE": False,
 }
 
 AUTHENTICATION_BACKENDS = [
@@ -177,8 +244,22 @@ SOCIALACCOUNT_PROVIDERS = {
 
 # Allow token and basic authentication on Swagger
 SWAGGER_SETTINGS = {
+    "DEFAULT_INFO": "customers.schema.api_info",
+    # Swagger UI loads the prebuilt document instead of introspecting the API
+    "SPEC_URL": ("openapi-schema", {"format": "json"}),
     "SECURITY_DEFINITIONS": {
         "Basic": {"type": "basic"},
         "Bearer": {"type": "apiKey", "name": "Authorization", "in": "header"},
-    }
+    },
 }
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+
+# Prebuilt OpenAPI documents served at /api/openapi.json and /api/openapi.yaml.
+# Build them with: python manage.py build_openapi_schema
+OPENAPI_SCHEMA_DIR = BASE_DIR / "openapi"
+
+# Files written by export jobs. Kept out of MEDIA_ROOT: they hold every
+# customer and are only served through the jobs API, /api/jobs/{id}/download/.
+EXPORTS_ROOT = BASE_DIR / "exports"
@@ -0,0 +1,60 @@
+"""
+API-only settings profile for crm_api.
+
+Serves the customer and user endpoints under /api/ and nothing else: the admin,
+browsable API, Google/allauth login, CORS, Swagger UI and shell extensions are
+not routed, and apart from the apps owning tables that reference users, not
+installed either, which keeps worker start-up and memory down.
+Tokens are issued by a deployment running the full crm_api.settings profile,
+and the OpenAPI document is served prebuilt from OPENAPI_SCHEMA_DIR.
+
+Select it with DJANGO_SETTINGS_MODULE=crm_api.settings_api.
+"""
+
+from .settings import *  # noqa: F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+# The admin (LogEntry), allauth.account (EmailAddress) and allauth.socialaccount
+# (SocialAccount) stay installed: their tables hold foreign keys to users, and
+# deleting a user must cascade into them. The admin is installed without
+# autodiscovery, as none of its pages are routed. Sessions stay as well, as
+# allauth's AccountMiddleware reads request.session; without a session cookie
+# that costs no query.
+UNUSED_APPS = {
+    "django.contrib.admin",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+    "corsheaders",
+    "allauth.socialaccount.providers.google",
+    "dj_rest_auth",
+    "dj_rest_auth.registration",
+    "django_extensions",
+    "drf_yasg",
+}
+
+# Token authentication needs neither CSRF protection nor messages.
+UNUSED_MIDDLEWARE = {
+    "corsheaders.middleware.CorsMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+}
+
+INSTALLED_APPS = [
+    "django.contrib.admin.apps.SimpleAdminConfig",
+    *(app for app in INSTALLED_APPS if app not in UNUSED_APPS),
+]
+
+MIDDLEWARE = [name for name in MIDDLEWARE if name not in UNUSED_MIDDLEWARE]
+
+ROOT_URLCONF = "crm_api.urls_api"
+
+AUTHENTICATION_BACKENDS = ["django.contrib.auth.backends.ModelBackend"]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
+}
+
+# The admin's pages, which need messages and authentication, are not routed.
+SILENCED_SYSTEM_CHECKS = ["admin.E406", "admin.E408", "admin.E409"]
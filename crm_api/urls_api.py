@@ -0,0 +1,12 @@
+"""
+URL configuration for the API-only settings profile (crm_api.settings_api).
+"""
+
+from django.urls import path, include
+from django.conf import settings
+from django.conf.urls.static import static
+
+
+urlpatterns = [
+    path("api/", include("customers.api_urls")),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,5 +1,44 @@
 from django.contrib import admin
-from .models import User, Customer
+from .audit import acting_as
+from .models import User, Customer, CustomerChange
+
+
+class CustomerAdmin(admin.ModelAdmin):
+    """Attribute the changes made through the admin to the logged in user."""
+
+    def save_model(self, request, obj, form, change):
+        with acting_as(request.user):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with acting_as(request.user):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with acting_as(request.user):
+            super().delete_queryset(request, queryset)
+
+
+class CustomerChangeAdmin(admin.ModelAdmin):
+    """The audit trail is append-only: entries can be browsed, never edited."""
+
+    # actor_id, not actor: the user may no longer exist.
+    list_display = ["timestamp", "customer_id", "action", "actor_id"]
+    list_filter = ["action"]
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 admin.site.register(User)
-admin.site.register(Customer)
+admin.site.register(Customer, CustomerAdmin)
+admin.site.register(CustomerChange, CustomerChangeAdmin)
@@ -0,0 +1,14 @@
+from django.urls import path, include, re_path
+from rest_framework.routers import DefaultRouter
+
+from .views import CustomerViewSet, JobViewSet, UserViewSet, openapi_schema
+
+router = DefaultRouter()
+router.register(r"customers", CustomerViewSet)
+router.register(r"users", UserViewSet)
+router.register(r"jobs", JobViewSet)
+
+urlpatterns = [
+    path("", include(router.urls)),
+    re_path(r"^openapi\.(?P<format>json|yaml)$", openapi_schema, name="openapi-schema"),
+]
@@ -0,0 +1,157 @@
+"""
+Write-behind audit trail for Customer changes.
+
+The ``post_save`` and ``post_delete`` signals of Customer describe each change
+with ``audit_log.record``, so writes made through the API, the admin, jobs or
+the shell are all recorded. Whoever makes the change is set with ``acting_as``.
+
+Entries only join the in-memory buffer once the surrounding transaction
+commits, and are written with a single ``bulk_create`` per batch by a
+background thread, so recording a change never adds an INSERT to the request
+that made it.
+"""
+
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    DataError,
+    IntegrityError,
+    close_old_connections,
+    transaction,
+)
+from django.utils import timezone
+
+from .models import CustomerChange
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Flush from a background thread. When False, entries are written as soon
+    # as their transaction commits (useful for tests and management commands).
+    "ASYNC": True,
+    # Wake the flusher early once this many entries are waiting.
+    "BATCH_SIZE": 100,
+    # Seconds between background flushes.
+    "FLUSH_INTERVAL": 1.0,
+}
+
+
+def get_audit_settings():
+    return {**DEFAULTS, **getattr(settings, "CUSTOMER_AUDIT", {})}
+
+
+current_actor = ContextVar("customer_audit_actor", default=None)
+
+
+@contextmanager
+def acting_as(user):
+    """Attribute the customer changes made in the block to ``user``."""
+    token = current_actor.set(user)
+    try:
+        yield
+    finally:
+        current_actor.reset(token)
+
+
+def diff(before, after):
+    """Return ``{field: [old, new]}`` for every field whose value changed."""
+    return {
+        field: [before.get(field), after.get(field)]
+        for field in {**before, **after}
+        if before.get(field) != after.get(field)
+    }
+
+
+class AuditLog:
+    def __init__(self):
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    def record(self, customer_id, action, changes, actor=None):
+        if actor is None:
+            actor = current_actor.get()
+        entry = CustomerChange(
+            customer_id=customer_id,
+            action=action,
+            changes=changes,
+            actor_id=actor.pk if actor and actor.is_authenticated else None,
+            timestamp=timezone.now(),
+        )
+        transaction.on_commit(lambda: self._enqueue(entry))
+
+    def flush(self):
+        """Write every buffered entry and return how many were written."""
+        with self._lock:
+            entries, self._pending = self._pending, []
+        if not entries:
+            return 0
+        try:
+            with transaction.atomic():
+                CustomerChange.objects.bulk_create(entries)
+            return len(entries)
+        except DatabaseError:
+            logger.warning(
+                "Batch of customer audit entries failed, retrying one by one"
+            )
+
+        # Isolate the entries the database rejects, so one of them cannot hold
+        # back the rest of the trail.
+        written = 0
+        for i, entry in enumerate(entries):
+            try:
+                with transaction.atomic():
+                    entry.save(force_insert=True)
+            except (IntegrityError, DataError):
+                logger.exception("Dropped customer audit entry: %s", entry)
+            except Exception:
+                # The database itself is failing; keep the rest for later.
+                with self._lock:
+                    self._pending[:0] = entries[i:]
+                raise
+            else:
+                written += 1
+        return written
+
+    def _enqueue(self, entry):
+        options = get_audit_settings()
+        with self._lock:
+            self._pending.append(entry)
+            full = len(self._pending) >= options["BATCH_SIZE"]
+        if not options["ASYNC"]:
+            self.flush()
+            return
+        self._start_worker(options["FLUSH_INTERVAL"])
+        if full:
+            self._wakeup.set()
+
+    def _start_worker(self, interval):
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(
+                target=self._run, args=(interval,), name="customer-audit", daemon=True
+            )
+            self._worker.start()
+        atexit.register(self.flush)
+
+    def _run(self, interval):
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush customer audit entries")
+            finally:
+                close_old_connections()
+
+
+audit_log = AuditLog()
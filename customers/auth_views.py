@@ -0,0 +1,24 @@
+from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
+from allauth.socialaccount.providers.oauth2.client import OAuth2Client
+from dj_rest_auth.registration.views import SocialLoginView
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.conf import settings
+from django.views.generic import RedirectView
+
+
+class UserRedirectView(LoginRequiredMixin, RedirectView):
+    """
+    This view is needed by the dj-rest-auth in order for google login to work.
+    It's a bug.
+    """
+
+    permanent = False
+
+    def get_redirect_url(self, *args, **kwargs):
+        return "redirect-url"
+
+
+class GoogleLogin(SocialLoginView):
+    adapter_class = GoogleOAuth2Adapter
+    client_class = OAuth2Client
+    callback_url = settings.GOOGLE_REDIRECT_URL
@@ -0,0 +1,153 @@
+"""
+Token authentication backed by a per-process cache of user snapshots.
+
+DRF's TokenAuthentication loads the token and its user on every request. Here
+the id, username, ``is_admin`` and ``is_active`` of the token's user are kept in
+memory, so authenticating costs a cache lookup instead of a query. The other
+user fields stay deferred and are loaded on first access.
+
+Snapshots carry the user's version from the ``CACHE`` cache, read before the
+user is loaded, which the signals in ``customers.signals`` bump once a
+transaction saving or deleting the user, or deleting one of their tokens,
+commits. A version bump must reach every worker,
+so snapshots are only used when that cache is shared between processes (or
+``ALLOW_LOCAL_CACHE`` says a single process serves requests). Snapshots also
+expire after ``TTL`` seconds.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+DEFAULTS = {
+    # Seconds a snapshot is trusted without seeing a version change.
+    "TTL": 60,
+    # Snapshots kept per process, least recently used dropped first.
+    "MAX_SIZE": 10000,
+    # Cache alias holding the user versions.
+    "CACHE": "default",
+    # Use snapshots even though that cache is private to the process. Only safe
+    # when a single process serves requests, e.g. with runserver.
+    "ALLOW_LOCAL_CACHE": False,
+}
+
+# Backends whose entries other processes never see.
+LOCAL_CACHES = (LocMemCache, DummyCache)
+
+# In model field order, as Model.from_db() expects; the id comes first.
+SNAPSHOT_FIELDS = [
+    field.attname
+    for field in User._meta.concrete_fields
+    if field.attname in ("id", "username", "is_admin", "is_active")
+]
+
+
+def get_user_cache_settings():
+    return {**DEFAULTS, **getattr(settings, "USER_SNAPSHOT_CACHE", {})}
+
+
+def version_cache():
+    return caches[get_user_cache_settings()["CACHE"]]
+
+
+def snapshots_enabled():
+    """Whether a version bump reaches every process serving requests."""
+    if get_user_cache_settings()["ALLOW_LOCAL_CACHE"]:
+        return True
+    return not isinstance(version_cache(), LOCAL_CACHES)
+
+
+def version_key(user_id):
+    return f"user_snapshot_version:{user_id}"
+
+
+def current_version(user_id):
+    cache = version_cache()
+    version = cache.get(version_key(user_id))
+    if version is None:
+        cache.add(version_key(user_id), uuid.uuid4().hex, None)
+        version = cache.get(version_key(user_id))
+    return version
+
+
+def invalidate_user(user_id):
+    """
+    Make every process reload its snapshot of the user. Call it once the change
+    is committed, so that no reload can cache the old row under the new version.
+    """
+    version_cache().set(version_key(user_id), uuid.uuid4().hex, None)
+
+
+class UserSnapshotCache:
+    def __init__(self):
+        # Token key -> (user values, version, loaded at).
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token_key):
+        with self._lock:
+            entry = self._snapshots.get(token_key)
+            if entry is not None:
+                self._snapshots.move_to_end(token_key)
+        if entry is None:
+            return None
+        values, version, loaded_at = entry
+        if time.monotonic() - loaded_at > get_user_cache_settings()["TTL"]:
+            return None
+        if version_cache().get(version_key(values[0])) != version:
+            return None
+        return self.build_user(values)
+
+    def put(self, token_key, user, version):
+        values = tuple(getattr(user, field) for field in SNAPSHOT_FIELDS)
+        with self._lock:
+            self._snapshots[token_key] = (values, version, time.monotonic())
+            self._snapshots.move_to_end(token_key)
+            while len(self._snapshots) > get_user_cache_settings()["MAX_SIZE"]:
+                self._snapshots.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+    @staticmethod
+    def build_user(values):
+        # A fresh instance per request, with the remaining fields deferred.
+        return User.from_db(DEFAULT_DB_ALIAS, SNAPSHOT_FIELDS, values)
+
+
+user_snapshots = UserSnapshotCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if not snapshots_enabled():
+            return super().authenticate_credentials(key)
+        user = user_snapshots.get(key)
+        if user is None:
+            user_id = (
+                Token.objects.filter(key=key).values_list("user_id", flat=True).first()
+            )
+            if user_id is None:
+                # Unknown token; let DRF reject it.
+                return super().authenticate_credentials(key)
+            # Read the version first: if the user changes while being loaded,
+            # the snapshot is tagged with the old version and not trusted.
+            version = current_version(user_id)
+            user, _ = super().authenticate_credentials(key)
+            user_snapshots.put(key, user, version)
+        elif not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        return user, Token(key=key, user_id=user.pk)
@@ -0,0 +1,140 @@
+"""
+Content codings used to compress responses.
+
+gzip is always available; zstd and brotli are added when the ``zstandard`` and
+``brotli`` packages are installed. ``CODECS`` lists them best first, which
+decides between codings the client accepts equally.
+"""
+
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+class Codec:
+    """Compress whole bodies or, through ``compressobj()``, a stream of chunks."""
+
+    def compress(self, data):
+        raise NotImplementedError
+
+    def compressobj(self):
+        """Return an object with ``compress(chunk)`` and a final ``flush()``."""
+        raise NotImplementedError
+
+
+class GzipCodec(Codec):
+    level = 6
+
+    def compress(self, data):
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def compressobj(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+
+class BrotliCodec(Codec):
+    # Quality 11 is meant for static assets; 5 suits per-request compression.
+    quality = 5
+
+    class Compressor:
+        def __init__(self, quality):
+            self.compressor = brotli.Compressor(quality=quality)
+
+        def compress(self, chunk):
+            return self.compressor.process(chunk)
+
+        def flush(self):
+            return self.compressor.finish()
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.quality)
+
+    def compressobj(self):
+        return self.Compressor(self.quality)
+
+
+class ZstdCodec(Codec):
+    level = 3
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def compressobj(self):
+        return zstandard.ZstdCompressor(level=self.level).compressobj()
+
+
+CODECS = {}
+if zstandard is not None:
+    CODECS["zstd"] = ZstdCodec()
+if brotli is not None:
+    CODECS["br"] = BrotliCodec()
+CODECS["gzip"] = GzipCodec()
+
+
+def accepted_codings(accept_encoding):
+    """
+    Map the content codings an ``Accept-Encoding`` header allows to their
+    q-values.
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip() and quality > 0:
+            accepted[coding.strip()] = quality
+    return accepted
+
+
+def best_coding(accept_encoding, codings):
+    """
+    Return the coding of ``codings`` the client ranks highest, or ``None``.
+    The order of ``codings`` only breaks ties between equal q-values.
+    """
+    accepted = accepted_codings(accept_encoding)
+    return max(
+        (coding for coding in codings if coding in accepted),
+        key=accepted.get,
+        default=None,
+    )
+
+
+def choose_codec(accept_encoding):
+    """Return ``(coding, codec)`` for the best accepted coding, or ``None``."""
+    coding = best_coding(accept_encoding, CODECS)
+    if coding is None:
+        return None
+    return coding, CODECS[coding]
+
+
+def compress_sequence(codec, sequence):
+    compressor = codec.compressobj()
+    for chunk in sequence:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def compress_async_sequence(codec, sequence):
+    compressor = codec.compressobj()
+    async for chunk in sequence:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
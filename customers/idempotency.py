@@ -0,0 +1,215 @@
+"""
+``Idempotency-Key`` support for write requests.
+
+The first response to a key is kept in the ``IdempotencyRecord`` table, under a
+hash of the client's token and the key, and is returned as-is when the client
+retries: the view does not run again. A retry arriving while the first request
+is still in flight, on any worker process, waits for its response instead of
+executing a second time. A key reused for a request with a different method,
+path or body is refused.
+
+A record only gets an expiry once its response is stored, so a slow request
+keeps its key however long it runs. The key of a request that never finished
+(e.g. its worker was killed) is freed after ``STALE_AFTER`` seconds.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Seconds a stored response can be replayed for.
+    "TTL": 24 * 3600,
+    # Seconds a retry waits for the original request before giving up.
+    "LOCK_TIMEOUT": 30,
+    # Seconds after which a request still in flight is assumed lost and its
+    # key freed; well past the longest time a worker may take for a request.
+    "STALE_AFTER": 600,
+    # Seconds between checks while waiting.
+    "POLL_INTERVAL": 0.05,
+}
+
+# Headers worth replaying along with the stored body.
+REPLAYED_HEADERS = ["Location"]
+
+# Responses that are not stored, so the request can be retried: validation
+# errors, throttled requests and server errors.
+RETRYABLE_STATUSES = {status.HTTP_400_BAD_REQUEST, status.HTTP_429_TOO_MANY_REQUESTS}
+
+
+def get_idempotency_settings():
+    return {**DEFAULTS, **getattr(settings, "IDEMPOTENCY", {})}
+
+
+def file_digest(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def request_fingerprint(request):
+    """Hash the method, path and parsed body of a request."""
+    data = request.data
+    if hasattr(data, "lists"):
+        # A QueryDict from the form or multipart parsers.
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, default=file_digest)
+    return hashlib.sha256(
+        f"{request.method} {request.get_full_path()}\n{body}".encode()
+    ).hexdigest()
+
+
+def expired():
+    """Match expired responses and requests that were lost in flight."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=get_idempotency_settings()["STALE_AFTER"])
+    return Q(expires_at__lte=now) | Q(expires_at__isnull=True, created_at__lte=stale)
+
+
+def purge_expired():
+    """
+    Delete the records whose response can no longer be replayed, and those of
+    requests that never finished.
+    """
+    return IdempotencyRecord.objects.filter(expired()).delete()[0]
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still in progress."
+    default_code = "idempotency_conflict"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used for another request."
+    default_code = "idempotency_key_reused"
+
+
+class Replay(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class IdempotencyMixin:
+    """
+    Make the unsafe methods of a view honour the ``Idempotency-Key`` header.
+    Validation errors, server errors and throttled requests are not stored, so
+    they can be retried.
+    """
+
+    idempotency_header = "Idempotency-Key"
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.idempotency_record = None
+        key = request.headers.get(self.idempotency_header)
+        if key is None or request.method in SAFE_METHODS:
+            return
+        if not 0 < len(key) <= 255:
+            raise ValidationError(
+                {self.idempotency_header: "Must be between 1 and 255 characters."}
+            )
+
+        client = getattr(request.auth, "key", None) or f"user:{request.user.pk}"
+        digest = hashlib.sha256(f"{client}:{key}".encode()).hexdigest()
+        self.claim_idempotency_key(digest, request_fingerprint(request))
+
+    def claim_idempotency_key(self, key, fingerprint):
+        """
+        Reserve the key for this request, or raise ``Replay`` with the response
+        stored for it, waiting while the original request is in flight.
+        """
+        options = get_idempotency_settings()
+        deadline = time.monotonic() + options["LOCK_TIMEOUT"]
+        while True:
+            IdempotencyRecord.objects.filter(expired(), key=key).delete()
+            try:
+                # The unique key makes the insert the lock: only one request
+                # across all workers can hold it.
+                with transaction.atomic():
+                    self.idempotency_record = IdempotencyRecord.objects.create(
+                        key=key, fingerprint=fingerprint
+                    )
+                return
+            except IntegrityError:
+                pass
+
+            # None means the original request failed and released the key.
+            record = IdempotencyRecord.objects.filter(key=key).first()
+            if record is not None:
+                if record.fingerprint != fingerprint:
+                    raise IdempotencyKeyReused()
+                if record.status is not None:
+                    break
+                if time.monotonic() >= deadline:
+                    raise IdempotencyConflict()
+                time.sleep(options["POLL_INTERVAL"])
+
+        response = Response(record.data, status=record.status)
+        for header, value in record.headers.items():
+            response[header] = value
+        response["Idempotent-Replayed"] = "true"
+        raise Replay(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Replay):
+            return exc.response
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            # Unhandled errors never reach finalize_response; free the key.
+            self.release_idempotency_key()
+            raise
+
+    def release_idempotency_key(self):
+        record = getattr(self, "idempotency_record", None)
+        if record is not None:
+            record.delete()
+            self.idempotency_record = None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        record = getattr(self, "idempotency_record", None)
+        if record is None:
+            return response
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES:
+            self.release_idempotency_key()
+        else:
+            updated = IdempotencyRecord.objects.filter(pk=record.pk).update(
+                status=response.status_code,
+                data=response.data,
+                headers={
+                    header: response[header]
+                    for header in REPLAYED_HEADERS
+                    if response.has_header(header)
+                },
+                expires_at=timezone.now()
+                + timedelta(seconds=get_idempotency_settings()["TTL"]),
+            )
+            if not updated:
+                # The request outlived STALE_AFTER, so a retry may have run it
+                # again.
+                logger.warning(
+                    "Idempotency record %s was freed before its request "
+                    "finished; the response was not stored.",
+                    record.key,
+                )
+        return response
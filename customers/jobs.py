@@ -0,0 +1,186 @@
+"""
+Background jobs backed by the database, with no external broker.
+
+Views ``enqueue`` a job and answer ``202 Accepted``; the ``run_jobs`` management
+command claims queued jobs and runs their handlers on a thread pool. A job that
+raises is retried with exponential backoff until ``MAX_ATTEMPTS`` is reached,
+unless the error is one of ``PERMANENT_ERRORS``.
+"""
+
+import csv
+import io
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .audit import acting_as
+from .models import Customer, Job
+from .serializers import CustomerSerializer
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Attempts before a job is marked as failed.
+    "MAX_ATTEMPTS": 5,
+    # Seconds before the first retry, doubled on every further attempt.
+    "RETRY_DELAY": 10,
+    # Seconds after which a running job is assumed lost (e.g. its worker was
+    # killed) and may be claimed again.
+    "TIMEOUT": 600,
+    # Worker threads and seconds between polls of `manage.py run_jobs`.
+    "WORKERS": 4,
+    "POLL_INTERVAL": 1.0,
+}
+
+# Errors a retry would only repeat, such as an invalid payload: the job fails
+# at once.
+PERMANENT_ERRORS = (ValidationError, DjangoValidationError)
+
+
+def get_job_settings():
+    return {**DEFAULTS, **getattr(settings, "JOBS", {})}
+
+
+handlers = {}
+
+
+def handler(kind):
+    """Register the function that runs jobs of ``kind``."""
+
+    def register(func):
+        handlers[kind] = func
+        return func
+
+    return register
+
+
+def enqueue(kind, payload, user=None):
+    if kind not in handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        created_by=user if user and user.is_authenticated else None,
+        max_attempts=get_job_settings()["MAX_ATTEMPTS"],
+    )
+
+
+def claimable():
+    now = timezone.now()
+    stale = now - timedelta(seconds=get_job_settings()["TIMEOUT"])
+    return Job.objects.filter(
+        Q(status=Job.Status.QUEUED, run_after__lte=now)
+        | Q(status=Job.Status.RUNNING, started_at__lt=stale)
+    )
+
+
+def claim(limit):
+    """
+    Mark up to ``limit`` runnable jobs as running and return them. The claim is
+    a conditional UPDATE, so concurrent workers never run the same job.
+    """
+    claimed = []
+    for job in claimable().order_by("run_after", "id")[:limit]:
+        started_at = timezone.now()
+        updated = (
+            claimable()
+            .filter(pk=job.pk)
+            .update(status=Job.Status.RUNNING, started_at=started_at)
+        )
+        if updated:
+            job.status, job.started_at = Job.Status.RUNNING, started_at
+            claimed.append(job)
+    return claimed
+
+
+def run(job):
+    """Run a claimed job and record its outcome."""
+    job.attempts += 1
+    try:
+        with transaction.atomic():
+            result = handlers[job.kind](job)
+    except Exception as error:
+        logger.exception("Job %s failed (attempt %s)", job.pk, job.attempts)
+        job.error = f"{type(error).__name__}: {error}"
+        if job.attempts < job.max_attempts and not isinstance(error, PERMANENT_ERRORS):
+            delay = get_job_settings()["RETRY_DELAY"] * 2 ** (job.attempts - 1)
+            job.status = Job.Status.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+        else:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.Status.SUCCEEDED
+        job.result = result
+        job.error = ""
+        job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def run_in_thread(job):
+    try:
+        return run(job)
+    finally:
+        # Worker threads open their own connection; don't leak it.
+        connection.close()
+
+
+def export_storage():
+    """
+    Storage for exported files, outside MEDIA_ROOT so they are never served
+    publicly: they are downloaded through ``/api/jobs/{id}/download/``.
+    """
+    return FileSystemStorage(location=settings.EXPORTS_ROOT)
+
+
+def run_pending(limit=100):
+    """Claim and run runnable jobs in the calling thread."""
+    return [run(job) for job in claim(limit)]
+
+
+@handler("customers.delete")
+def delete_customers(job):
+    """Delete customers (and through django_cleanup, their photos)."""
+    deleted = 0
+    with acting_as(job.created_by):
+        for customer in Customer.objects.filter(pk__in=job.payload["ids"]):
+            customer.delete()
+            deleted += 1
+    return {"deleted": deleted}
+
+
+@handler("customers.import")
+def import_customers(job):
+    serializer = CustomerSerializer(data=job.payload["customers"], many=True)
+    serializer.is_valid(raise_exception=True)
+    created = []
+    with acting_as(job.created_by):
+        for data in serializer.validated_data:
+            customer = Customer.objects.create(
+                **data, created_by=job.created_by, modified_by=job.created_by
+            )
+            created.append(customer.pk)
+    return {"created": created}
+
+
+@handler("customers.export")
+def export_customers(job):
+    fields = ["id", "name", "surname", "created_by", "created_at", "updated_at"]
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(fields)
+    for row in Customer.objects.values_list(*fields).iterator():
+        writer.writerow(row)
+    name = export_storage().save(
+        f"customers-{job.pk}.csv", ContentFile(output.getvalue().encode())
+    )
+    return {"file": name}
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from customers import openapi
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the OpenAPI documents served at /api/openapi.json and "
+        "/api/openapi.yaml for the active settings profile. Skipped when its "
+        "URLconf, viewsets and serializers have not changed since the last build."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir",
+            default=None,
+            help=(
+                "Directory to write to. Defaults to a directory per ROOT_URLCONF "
+                "in settings.OPENAPI_SCHEMA_DIR."
+            ),
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild even if the schema sources are unchanged.",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["output_dir"] or openapi.schema_dir()
+        if not options["force"] and (
+            openapi.stored_fingerprint(directory) == openapi.fingerprint()
+        ):
+            self.stdout.write("OpenAPI schema is up to date.")
+            return
+        openapi.build(directory)
+        self.stdout.write(self.style.SUCCESS(f"OpenAPI schema built in {directory}"))
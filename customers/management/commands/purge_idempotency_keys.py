@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from customers import idempotency
+
+
+class Command(BaseCommand):
+    help = "Delete the Idempotency-Key records whose response has expired"
+
+    def handle(self, *args, **options):
+        count = idempotency.purge_expired()
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {count} expired idempotency records.")
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from customers import stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed customer statistics from scratch"
+
+    def handle(self, *args, **options):
+        count = stats.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Customer statistics rebuilt ({count} counters).")
+        )
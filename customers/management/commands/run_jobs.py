@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from customers import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs on a pool of worker threads"
+
+    def add_arguments(self, parser):
+        settings = jobs.get_job_settings()
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings["WORKERS"],
+            help="Number of worker threads.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings["POLL_INTERVAL"],
+            help="Seconds to wait before polling again when the queue is empty.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no runnable jobs are left instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        self.stdout.write(f"Running jobs with {workers} worker threads")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            running = set()
+            while True:
+                running = {future for future in running if not future.done()}
+                claimed = jobs.claim(workers - len(running))
+                for job in claimed:
+                    running.add(executor.submit(self.run_job, job))
+                if not claimed:
+                    if options["burst"] and not running:
+                        break
+                    time.sleep(options["poll_interval"])
+
+    def run_job(self, job):
+        job = jobs.run_in_thread(job)
+        self.stdout.write(f"{job} after {job.attempts} attempt(s)")
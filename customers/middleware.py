@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .compression import choose_codec, compress_async_sequence, compress_sequence
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Add ``RateLimit-*`` headers describing the bucket that served the request.
+    ``Retry-After`` is already set by DRF on throttled responses.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        rate_limit = getattr(request, "rate_limit", None)
+        if rate_limit:
+            response["RateLimit-Limit"] = rate_limit["limit"]
+            response["RateLimit-Remaining"] = rate_limit["remaining"]
+            response["RateLimit-Reset"] = rate_limit["reset"]
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with the best coding the client accepts (zstd, brotli or
+    gzip, see ``customers.compression``), streaming responses included.
+
+    Works like Django's GZipMiddleware, but bodies shorter than
+    ``COMPRESSION_MIN_SIZE`` bytes are left alone, since compressing them costs
+    more CPU than the bytes it saves. HTML pages (the admin, login and
+    browsable API pages, which carry CSRF tokens) are never compressed, which
+    keeps them out of reach of BREACH.
+    """
+
+    def process_response(self, request, response):
+        min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        # Avoid compressing if we've already got a content-encoding, if the
+        # body is an already compressed image (customer photos) or a page that
+        # may mix secrets with reflected input.
+        content_type = response.get("Content-Type", "")
+        if response.has_header("Content-Encoding") or content_type.startswith(
+            ("image/", "text/html")
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        chosen = choose_codec(request.headers.get("Accept-Encoding", ""))
+        if chosen is None:
+            return response
+        coding, codec = chosen
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_sequence(
+                    codec, response.streaming_content
+                )
+            else:
+                response.streaming_content = compress_sequence(
+                    codec, response.streaming_content
+                )
+            # The compressed size is unknown until the stream is consumed.
+            del response.headers["Content-Length"]
+        else:
+            # Return the compressed content only if it's actually shorter.
+            compressed_content = codec.compress(response.content)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        # A strong ETag would no longer match the transferred bytes.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = coding
+
+        return response
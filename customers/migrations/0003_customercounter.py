@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0002_customerchange"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CustomerCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[
+                            ("total", "Total"),
+                            ("creator", "Creator"),
+                            ("day", "Day"),
+                        ],
+                        max_length=7,
+                    ),
+                ),
+                ("key", models.CharField(blank=True, max_length=20)),
+                ("count", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="customercounter",
+            constraint=models.UniqueConstraint(
+                fields=("scope", "key"), name="unique_customer_counter"
+            ),
+        ),
+    ]
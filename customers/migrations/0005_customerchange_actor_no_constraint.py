@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("customers", "0004_job"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="customerchange",
+            name="actor",
+            field=models.ForeignKey(
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="customer_changes",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
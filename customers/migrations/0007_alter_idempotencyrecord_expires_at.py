@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("customers", "0006_idempotencyrecord"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="idempotencyrecord",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
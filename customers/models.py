@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -25,5 +27,165 @@ class Customer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Audited fields, by the attribute holding their value.
+    TRACKED_FIELDS = {
+        "name": "name",
+        "surname": "surname",
+        "photo": "photo",
+        "created_by": "created_by_id",
+    }
+
     def __str__(self):
         return f"{self.name} {self.surname}"
+
+    def tracked_values(self):
+        """
+        Return the audited field values of this instance, leaving out deferred
+        fields rather than loading them.
+        """
+        values = {}
+        for field, attname in self.TRACKED_FIELDS.items():
+            if attname in self.__dict__:
+                value = self.__dict__[attname]
+                if field == "photo":
+                    value = getattr(value, "name", value) or None
+                values[field] = value
+        return values
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The post_save receivers (statistics and audit trail) have compared
+        # against the previous values; later saves compare against these.
+        self._loaded_values = self.tracked_values()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so the audit trail and the statistics can
+        # follow changes to them.
+        instance._loaded_values = instance.tracked_values()
+        return instance
+
+
+class CustomerChange(models.Model):
+    """
+    Append-only audit entry for a create, update or delete of a Customer.
+
+    Entries are written in batches by ``customers.audit``, so ``customer_id`` is
+    a plain column rather than a foreign key: history must outlive the customer.
+    """
+
+    class Action(models.TextChoices):
+        CREATE = "create"
+        UPDATE = "update"
+        DELETE = "delete"
+
+    customer_id = models.BigIntegerField()
+    action = models.CharField(max_length=6, choices=Action.choices)
+    changes = models.JSONField(default=dict)
+    # Like customer_id, the actor outlives its row: entries written after the
+    # user is deleted must not fail on a foreign key constraint.
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="customer_changes",
+    )
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-timestamp", "-id"]
+        indexes = [models.Index(fields=["customer_id", "-timestamp"])]
+
+    def __str__(self):
+        return f"{self.action} customer {self.customer_id} at {self.timestamp}"
+
+
+class CustomerCounter(models.Model):
+    """
+    Precomputed customer statistics, maintained incrementally by
+    ``customers.stats`` and rebuilt by the ``rebuild_customer_stats`` command.
+    """
+
+    class Scope(models.TextChoices):
+        TOTAL = "total"
+        CREATOR = "creator"
+        DAY = "day"
+
+    scope = models.CharField(max_length=7, choices=Scope.choices)
+    # Empty for the total, the creator's id (empty when unknown) or an ISO date.
+    key = models.CharField(max_length=20, blank=True)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "key"], name="unique_customer_counter"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}: {self.count}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, queued in the database and executed by the
+    ``run_jobs`` management command (see ``customers.jobs``).
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        SUCCEEDED = "succeeded"
+        FAILED = "failed"
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=9, choices=Status.choices, default=Status.QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    run_after = models.DateTimeField(default=timezone.now)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="jobs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"{self.kind} job {self.pk} ({self.status})"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    The response to a write sent with an ``Idempotency-Key`` header, replayed
+    when the client retries (see ``customers.idempotency``). Kept in the
+    database so every worker process sees the same records.
+    """
+
+    # Hash of the client and its key.
+    key = models.CharField(max_length=64, unique=True)
+    # Hash of the method, path and body of the request that used the key.
+    fingerprint = models.CharField(max_length=64)
+    # Empty while the request is in flight.
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+    data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    headers = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set once the response is stored.
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"idempotency key {self.key} ({self.status or 'in flight'})"
@@ -0,0 +1,178 @@
+"""
+Prebuilt OpenAPI documents.
+
+``manage.py build_openapi_schema`` renders the schema once, in JSON and YAML,
+together with gzip (and, when the ``brotli`` package is installed, brotli)
+compressed copies. Workers serve those files from memory with an ETag instead
+of introspecting the API on every request.
+"""
+
+import gzip
+import hashlib
+import os
+from dataclasses import dataclass, field
+from importlib.util import find_spec
+
+from django.conf import settings
+
+from .compression import best_coding, brotli
+
+FORMATS = {"json": "application/json", "yaml": "application/yaml"}
+
+# Preferred content codings, best first, with the suffix of their files.
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+# Modules whose source determines the generated document, besides the active
+# ROOT_URLCONF.
+SCHEMA_SOURCES = [
+    "customers.api_urls",
+    "customers.models",
+    "customers.pagination",
+    "customers.renderers",
+    "customers.schema",
+    "customers.serializers",
+    "customers.urls",
+    "customers.views",
+]
+
+# Settings that change the generated document.
+SCHEMA_SETTINGS = ["ROOT_URLCONF", "REST_FRAMEWORK", "SWAGGER_SETTINGS"]
+
+FINGERPRINT_FILE = "fingerprint"
+
+
+@dataclass
+class SchemaDocument:
+    content_type: str
+    # Content coding ("identity", "gzip" or "br") -> body.
+    bodies: dict = field(default_factory=dict)
+    etag: str = ""
+
+    def negotiate(self, accept_encoding):
+        """Return the best content coding the client accepts."""
+        coding = best_coding(
+            accept_encoding, [coding for coding in ENCODINGS if coding in self.bodies]
+        )
+        return coding or "identity"
+
+
+def schema_dir():
+    """
+    Return where the documents of the active URLconf live. Settings profiles
+    route different endpoints, so each gets its own directory.
+    """
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, settings.ROOT_URLCONF)
+
+
+def fingerprint():
+    """
+    Hash the URLconf, viewsets and serializers the schema describes, and the
+    settings it is rendered with.
+    """
+    digest = hashlib.sha256()
+    for name in [settings.ROOT_URLCONF, *SCHEMA_SOURCES]:
+        # Read without importing: not every URLconf loads under every profile.
+        with open(find_spec(name).origin, "rb") as source:
+            digest.update(source.read())
+    for name in SCHEMA_SETTINGS:
+        digest.update(repr(getattr(settings, name, None)).encode())
+    return digest.hexdigest()
+
+
+def stored_fingerprint(directory):
+    try:
+        with open(os.path.join(directory, FINGERPRINT_FILE)) as stored:
+            return stored.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def generate():
+    """Render the schema with drf_yasg and return ``{format: bytes}``."""
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    from .schema import api_info
+
+    schema = OpenAPISchemaGenerator(info=api_info).get_schema(public=True)
+    return {
+        "json": OpenAPICodecJson(validators=[], pretty=True).encode(schema),
+        "yaml": OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def compress(content):
+    bodies = {
+        "identity": content,
+        "gzip": gzip.compress(content, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        bodies["br"] = brotli.compress(content, quality=11)
+    return bodies
+
+
+def build(directory):
+    """Write every format and its compressed copies to ``directory``."""
+    os.makedirs(directory, exist_ok=True)
+    for format, content in generate().items():
+        for coding, body in compress(content).items():
+            name = f"openapi.{format}" + ENCODINGS.get(coding, "")
+            with open(os.path.join(directory, name), "wb") as output:
+                output.write(body)
+    with open(os.path.join(directory, FINGERPRINT_FILE), "w") as output:
+        output.write(fingerprint())
+
+
+def load(directory, format):
+    """Read a prebuilt document and its compressed copies from ``directory``."""
+    path = os.path.join(directory, f"openapi.{format}")
+    with open(path, "rb") as source:
+        content = source.read()
+    document = SchemaDocument(
+        content_type=FORMATS[format],
+        bodies={"identity": content},
+        etag=hashlib.sha256(content).hexdigest()[:32],
+    )
+    for coding, suffix in ENCODINGS.items():
+        try:
+            with open(path + suffix, "rb") as source:
+                document.bodies[coding] = source.read()
+        except FileNotFoundError:
+            pass
+    return document
+
+
+def from_memory(format):
+    """Render a document in-process, for when no prebuilt copy exists."""
+    content = generate()[format]
+    return SchemaDocument(
+        content_type=FORMATS[format],
+        bodies=compress(content),
+        etag=hashlib.sha256(content).hexdigest()[:32],
+    )
+
+
+_documents = {}
+
+
+def get_document(format):
+    """
+    Return the document for ``format``, kept in memory once read.
+
+    The prebuilt file is re-read when it changes on disk. Without one, the
+    schema is rendered once in-process.
+    """
+    path = os.path.join(schema_dir(), f"openapi.{format}")
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    cached = _documents.get(path)
+    if cached is None or cached[0] != mtime:
+        if mtime is None:
+            document = from_memory(format)
+        else:
+            document = load(schema_dir(), format)
+        cached = _documents[path] = (mtime, document)
+    return cached[1]
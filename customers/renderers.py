@@ -0,0 +1,51 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+
+def to_columns(data):
+    """
+    Turn a list of objects into ``{"columns": [...], "rows": [[...], ...]}`` so
+    that field names are sent once instead of once per object. Paginated
+    responses have their ``results`` converted; anything else is unchanged.
+    """
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        return {**data, "results": to_columns(data["results"])}
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        return data
+    columns = list(data[0]) if data else []
+    return {
+        "columns": columns,
+        "rows": [[row[column] for column in columns] for row in data],
+    }
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON with lists in columnar form, see ``to_columns``."""
+
+    media_type = "application/vnd.crm.columnar+json"
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_columns(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack output. Available when the ``msgpack`` package is installed.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Dates, decimals and UUIDs are encoded the same way as in JSON.
+        return msgpack.packb(data, default=JSONEncoder().default)
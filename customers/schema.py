@@ -0,0 +1,6 @@
+from drf_yasg import openapi
+
+api_info = openapi.Info(
+    title="CRM API",
+    default_version="v1",
+)
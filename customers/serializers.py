@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from .models import Customer, User
+from .models import Customer, CustomerChange, Job, User
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -50,3 +50,30 @@ class CustomerSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         validated_data["modified_by"] = self.context["request"].user
         return super().update(instance, validated_data)
+
+
+class CustomerChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CustomerChange
+        fields = ["id", "customer_id", "action", "changes", "actor", "timestamp"]
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "kind",
+            "status",
+            "attempts",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class CustomerIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
@@ -0,0 +1,69 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from . import stats
+from .audit import audit_log, diff
+from .authentication import invalidate_user
+from .models import Customer, CustomerChange
+
+
+@receiver(post_save, sender=Customer)
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.customer_added(instance)
+    # Unknown when the creator was not loaded (e.g. deferred with only()).
+    elif "created_by" in getattr(instance, "_loaded_values", {}):
+        stats.creator_changed(
+            instance._loaded_values["created_by"], instance.created_by_id
+        )
+
+
+@receiver(post_delete, sender=Customer)
+def update_stats_on_delete(sender, instance, **kwargs):
+    stats.customer_removed(instance)
+
+
+@receiver(post_save, sender=Customer)
+def record_change_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    after = instance.tracked_values()
+    if created:
+        audit_log.record(instance.pk, CustomerChange.Action.CREATE, diff({}, after))
+    else:
+        # An instance not loaded from the database has no known prior state.
+        before = getattr(instance, "_loaded_values", {})
+        changes = diff(before, after)
+        if changes:
+            audit_log.record(instance.pk, CustomerChange.Action.UPDATE, changes)
+
+
+@receiver(post_delete, sender=Customer)
+def record_change_on_delete(sender, instance, **kwargs):
+    audit_log.record(
+        instance.pk, CustomerChange.Action.DELETE, diff(instance.tracked_values(), {})
+    )
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def update_stats_on_user_delete(sender, instance, **kwargs):
+    stats.creator_deleted(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_snapshot(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_user, instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_snapshot(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_user, instance.user_id))
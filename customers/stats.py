@@ -0,0 +1,117 @@
+"""
+Incrementally maintained customer statistics.
+
+Every counter change is a single ``UPDATE ... SET count = count + delta`` so
+concurrent writers never lose increments, and reading the statistics never
+scans the customer table.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Customer, CustomerCounter
+
+Scope = CustomerCounter.Scope
+
+
+def creator_key(user_id):
+    return "" if user_id is None else str(user_id)
+
+
+def day_key(created_at):
+    return timezone.localdate(created_at).isoformat()
+
+
+def bump(scope, key, delta):
+    updated = CustomerCounter.objects.filter(scope=scope, key=key).update(
+        count=F("count") + delta
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            CustomerCounter.objects.create(scope=scope, key=key, count=delta)
+    except IntegrityError:
+        # Another writer created the row first.
+        bump(scope, key, delta)
+
+
+def customer_added(customer):
+    bump(Scope.TOTAL, "", 1)
+    bump(Scope.CREATOR, creator_key(customer.created_by_id), 1)
+    bump(Scope.DAY, day_key(customer.created_at), 1)
+
+
+def customer_removed(customer):
+    bump(Scope.TOTAL, "", -1)
+    bump(Scope.CREATOR, creator_key(customer.created_by_id), -1)
+    bump(Scope.DAY, day_key(customer.created_at), -1)
+
+
+def creator_changed(old_user_id, new_user_id):
+    if old_user_id == new_user_id:
+        return
+    bump(Scope.CREATOR, creator_key(old_user_id), -1)
+    bump(Scope.CREATOR, creator_key(new_user_id), 1)
+
+
+def creator_deleted(user_id):
+    """Move the customers of a deleted user to the unknown creator."""
+    with transaction.atomic():
+        # Hold the row until the transfer commits so no concurrent bump is lost.
+        # SQLite ignores FOR UPDATE, but there the user's deletion, which sends
+        # this signal, already holds the database's write lock.
+        counter = (
+            CustomerCounter.objects.select_for_update()
+            .filter(scope=Scope.CREATOR, key=creator_key(user_id))
+            .first()
+        )
+        if counter is not None:
+            counter.delete()
+            bump(Scope.CREATOR, creator_key(None), counter.count)
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every counter from the customer table."""
+    per_creator = Customer.objects.values("created_by").annotate(count=Count("id"))
+    per_day = (
+        Customer.objects.annotate(day=TruncDate("created_at"))
+        .values("day")
+        .annotate(count=Count("id"))
+    )
+    counters = [
+        CustomerCounter(scope=Scope.TOTAL, key="", count=Customer.objects.count())
+    ]
+    counters += [
+        CustomerCounter(
+            scope=Scope.CREATOR, key=creator_key(row["created_by"]), count=row["count"]
+        )
+        for row in per_creator
+    ]
+    counters += [
+        CustomerCounter(scope=Scope.DAY, key=row["day"].isoformat(), count=row["count"])
+        for row in per_day
+    ]
+    CustomerCounter.objects.all().delete()
+    CustomerCounter.objects.bulk_create(counters)
+    return len(counters)
+
+
+def get_stats():
+    total = 0
+    per_creator = []
+    per_day = []
+    counters = CustomerCounter.objects.filter(count__gt=0).order_by("key")
+    for scope, key, count in counters.values_list("scope", "key", "count"):
+        if scope == Scope.TOTAL:
+            total = count
+        elif scope == Scope.CREATOR:
+            per_creator.append(
+                {"created_by": int(key) if key else None, "count": count}
+            )
+        else:
+            per_day.append({"date": key, "count": count})
+    return {"total": total, "per_creator": per_creator, "per_day": per_day}
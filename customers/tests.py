@@ -1,14 +1,49 @@
+import gzip
+import hashlib
 import io
 import os
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
 
 from PIL import Image
+from allauth.account.models import EmailAddress
+from allauth.socialaccount.models import SocialAccount
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.db import DatabaseError, connection
+from django.db.models.signals import post_save
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 
-from .models import Customer, User
+from . import jobs, signals
+from .audit import acting_as, audit_log
+from .authentication import invalidate_user, user_snapshots
+from .compression import CODECS, choose_codec, zstandard
+from .middleware import CompressionMiddleware
+from .models import (
+    Customer,
+    CustomerChange,
+    CustomerCounter,
+    IdempotencyRecord,
+    Job,
+    User,
+)
+from .renderers import msgpack
+from .serializers import CustomerSerializer
 
 
 def generate_photo_file():
@@ -120,6 +155,674 @@ class CustomerAPITest(APITestCase):
                 customer.photo.delete()
 
 
+@override_settings(CUSTOMER_AUDIT={"ASYNC": False})
+class CustomerHistoryAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create_customer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("customer-list"), {"name": "Alice", "surname": "Smith"}
+            )
+        return response.data["id"]
+
+    def test_history_records_create_update_delete(self):
+        customer_id = self.create_customer()
+        url = reverse("customer-detail", kwargs={"pk": customer_id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {"name": "Alicia"})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(url)
+
+        response = self.client.get(
+            reverse("customer-history", kwargs={"pk": customer_id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        delete, update, create = response.data["results"]
+        self.assertEqual(create["action"], CustomerChange.Action.CREATE)
+        self.assertEqual(create["changes"]["name"], [None, "Alice"])
+        self.assertEqual(update["action"], CustomerChange.Action.UPDATE)
+        self.assertEqual(update["changes"], {"name": ["Alice", "Alicia"]})
+        self.assertEqual(update["actor"], self.user.pk)
+        self.assertEqual(delete["action"], CustomerChange.Action.DELETE)
+
+    def test_unchanged_update_is_not_recorded(self):
+        customer_id = self.create_customer()
+        url = reverse("customer-detail", kwargs={"pk": customer_id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {"name": "Alice"})
+        self.assertEqual(CustomerChange.objects.count(), 1)
+
+    def test_rolled_back_change_is_not_recorded(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.client.post(
+                reverse("customer-list"), {"name": "Alice", "surname": "Smith"}
+            )
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(audit_log.flush(), 0)
+        self.assertEqual(CustomerChange.objects.count(), 0)
+
+    @override_settings(CUSTOMER_AUDIT={"ASYNC": True})
+    def test_entries_are_buffered_and_flushed_in_one_batch(self):
+        with mock.patch.object(audit_log, "_start_worker"):
+            for _ in range(3):
+                self.create_customer()
+        self.assertEqual(CustomerChange.objects.count(), 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(audit_log.flush(), 3)
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(CustomerChange.objects.count(), 3)
+
+    @override_settings(CUSTOMER_AUDIT={"ASYNC": True})
+    def test_rejected_entry_does_not_block_the_trail(self):
+        with mock.patch.object(audit_log, "_start_worker"):
+            customer_id = self.create_customer()
+            with self.captureOnCommitCallbacks(execute=True):
+                audit_log.record(None, CustomerChange.Action.UPDATE, {})
+            user_id = self.user.pk
+            self.user.delete()
+            with self.assertLogs("customers.audit", "ERROR"):
+                self.assertEqual(audit_log.flush(), 1)
+        self.assertEqual(audit_log.flush(), 0)
+        change = CustomerChange.objects.get()
+        self.assertEqual(change.customer_id, customer_id)
+        # The actor's id is kept after the user is gone.
+        self.assertEqual(change.actor_id, user_id)
+
+    def test_history_survives_flush_failure(self):
+        customer_id = self.create_customer()
+        url = reverse("customer-history", kwargs={"pk": customer_id})
+        with mock.patch.object(audit_log, "flush", side_effect=DatabaseError):
+            with self.assertLogs("customers.views", "ERROR"):
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+
+    def test_changes_outside_the_api_are_recorded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = Customer.objects.create(name="Bob", surname="Jones")
+        with self.captureOnCommitCallbacks(execute=True):
+            with acting_as(self.user):
+                customer = Customer.objects.get(pk=customer.pk)
+                customer.surname = "Brown"
+                customer.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.filter(pk=customer.pk).delete()
+
+        delete, update, create = CustomerChange.objects.filter(customer_id=customer.pk)
+        self.assertEqual(create.action, CustomerChange.Action.CREATE)
+        self.assertIsNone(create.actor_id)
+        self.assertEqual(update.changes, {"surname": ["Jones", "Brown"]})
+        self.assertEqual(update.actor_id, self.user.pk)
+        self.assertEqual(delete.action, CustomerChange.Action.DELETE)
+        self.assertEqual(delete.changes["surname"], ["Brown", None])
+
+
+@unittest.skipUnless(
+    admin.site.is_registered(CustomerChange), "the admin is not set up"
+)
+class CustomerChangeAdminTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="pass")
+        self.client.force_login(self.user)
+        self.change = CustomerChange.objects.create(
+            customer_id=1,
+            action=CustomerChange.Action.CREATE,
+            actor_id=999,
+            timestamp=timezone.now(),
+        )
+
+    def test_entries_are_read_only(self):
+        url = reverse("admin:customers_customerchange_change", args=[self.change.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.post(url, {"action": CustomerChange.Action.DELETE})
+        self.change.refresh_from_db()
+        self.assertEqual(self.change.action, CustomerChange.Action.CREATE)
+
+        delete_url = reverse(
+            "admin:customers_customerchange_delete", args=[self.change.pk]
+        )
+        self.assertEqual(self.client.post(delete_url).status_code, 403)
+        add_url = reverse("admin:customers_customerchange_add")
+        self.assertEqual(self.client.get(add_url).status_code, 403)
+
+    def test_changelist(self):
+        url = reverse("admin:customers_customerchange_changelist")
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class CustomerStatsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.other_user = User.objects.create_user(
+            username="otheruser", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("customer-stats")
+
+    def creator_counts(self, response):
+        return {row["created_by"]: row["count"] for row in response.data["per_creator"]}
+
+    def test_counters_follow_create_delete_and_creator_changes(self):
+        first = Customer.objects.create(name="A", surname="A", created_by=self.user)
+        Customer.objects.create(name="B", surname="B", created_by=self.user)
+        Customer.objects.create(name="C", surname="C")
+        first.delete()
+        moved = Customer.objects.get(name="B")
+        moved.created_by = self.other_user
+        moved.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 2)
+        self.assertEqual(
+            self.creator_counts(response), {self.other_user.pk: 1, None: 1}
+        )
+        self.assertEqual(response.data["per_day"][0]["count"], 2)
+
+    def test_deleted_creator_moves_to_unknown(self):
+        Customer.objects.create(name="A", surname="A", created_by=self.other_user)
+        self.other_user.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(self.creator_counts(response), {None: 1})
+
+    def test_repeated_saves_of_one_instance(self):
+        # The statistics must not rely on the audit receiver.
+        post_save.disconnect(signals.record_change_on_save, sender=Customer)
+        self.addCleanup(
+            post_save.connect, signals.record_change_on_save, sender=Customer
+        )
+        customer = Customer.objects.create(name="A", surname="A", created_by=self.user)
+        for user in (self.other_user, self.user, self.other_user):
+            customer.created_by = user
+            customer.save()
+        response = self.client.get(self.url)
+        self.assertEqual(self.creator_counts(response), {self.other_user.pk: 1})
+
+    def test_deferred_creator_is_left_alone(self):
+        customer = Customer.objects.create(name="A", surname="A", created_by=self.user)
+        customer = Customer.objects.only("name").get(pk=customer.pk)
+        customer.name = "B"
+        customer.save()
+        response = self.client.get(self.url)
+        self.assertEqual(self.creator_counts(response), {self.user.pk: 1})
+
+    def test_stats_do_not_scan_customers(self):
+        Customer.objects.create(name="A", surname="A", created_by=self.user)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_rebuild_matches_incremental_counters(self):
+        Customer.objects.create(name="A", surname="A", created_by=self.user)
+        Customer.objects.create(name="B", surname="B")
+        expected = self.client.get(self.url).data
+
+        CustomerCounter.objects.all().delete()
+        call_command("rebuild_customer_stats", stdout=io.StringIO())
+        self.assertEqual(self.client.get(self.url).data, expected)
+
+
+@override_settings(
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {
+            "read": "2/min",
+            "write": "1/min",
+            "upload": "1/min",
+        },
+    }
+)
+class ThrottlingAPITest(APITestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.url = reverse("customer-list")
+
+    def tearDown(self):
+        for customer in Customer.objects.all():
+            if customer.photo:
+                customer.photo.delete()
+
+    def test_reads_are_throttled_with_retry_after(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["RateLimit-Limit"], "2")
+        self.assertEqual(response["RateLimit-Remaining"], "1")
+        self.client.get(self.url)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["RateLimit-Remaining"], "0")
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+    def test_reads_writes_and_routes_have_separate_budgets(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        data = {"name": "Alice", "surname": "Smith"}
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["RateLimit-Limit"], "1")
+        response = self.client.get(
+            reverse("customer-detail", kwargs={"pk": response.data["id"]})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # Uploads have their own budget.
+        response = self.client.post(
+            self.url, {**data, "photo": generate_photo_file()}, format="multipart"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_form_post_without_files_uses_write_budget(self):
+        data = {"name": "Alice", "surname": "Smith"}
+        self.client.post(self.url, data, format="multipart")
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_bucket_refills_over_time(self):
+        with mock.patch("customers.throttling.TokenBucketThrottle.timer") as timer:
+            timer.return_value = 1000.0
+            self.client.get(self.url)
+            self.client.get(self.url)
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+            timer.return_value = 1030.0
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class CustomerRenderingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        Customer.objects.bulk_create(
+            Customer(name=f"Name{i}", surname=f"Surname{i}", created_by=self.user)
+            for i in range(50)
+        )
+        self.url = reverse("customer-list")
+
+    def test_columnar_list(self):
+        response = self.client.get(
+            self.url, HTTP_ACCEPT="application/vnd.crm.columnar+json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["columns"][:3], ["id", "name", "surname"])
+        self.assertEqual(len(data["rows"]), 50)
+        self.assertEqual(data["rows"][0][1], "Name0")
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_list(self):
+        response = self.client.get(self.url, {"format": "msgpack"})
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(len(data), 50)
+        self.assertEqual(data[0]["name"], "Name0")
+
+    def test_large_response_is_compressed(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_best_accepted_coding_is_used(self):
+        response = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING="gzip, br, zstd;q=0.5"
+        )
+        self.assertEqual(
+            response["Content-Encoding"], "br" if "br" in CODECS else "gzip"
+        )
+
+    def test_codings_are_ranked_by_quality(self):
+        self.assertEqual(choose_codec("zstd;q=0.5, br;q=0.8, gzip")[0], "gzip")
+        self.assertEqual(choose_codec("GZIP;Q=0.9, identity")[0], "gzip")
+        self.assertIsNone(choose_codec("gzip;q=0, identity"))
+        # Equal q-values fall back to the server's order.
+        self.assertEqual(
+            choose_codec("gzip;q=0.5, br;q=0.5, zstd;q=0.5")[0], next(iter(CODECS))
+        )
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_compression(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="zstd")
+        self.assertEqual(response["Content-Encoding"], "zstd")
+        self.assertEqual(
+            zstandard.ZstdDecompressor().decompress(response.content), plain.content
+        )
+
+    def test_html_is_not_compressed(self):
+        middleware = CompressionMiddleware(
+            lambda request: HttpResponse("<p>page</p>" * 200)
+        )
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        response = middleware(request)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_small_response_is_not_compressed(self):
+        url = reverse("customer-detail", kwargs={"pk": Customer.objects.first().pk})
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class OpenAPISchemaTest(APITestCase):
+    def setUp(self):
+        self.schema_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.schema_dir.cleanup)
+        settings_override = override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command("build_openapi_schema", stdout=io.StringIO())
+        self.url = reverse("openapi-schema", kwargs={"format": "json"})
+
+    def test_serves_prebuilt_schema_with_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json()["info"]["title"], "CRM API")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_serves_yaml(self):
+        response = self.client.get(reverse("openapi-schema", kwargs={"format": "yaml"}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/yaml")
+
+    def test_serves_precompressed_schema(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertNotEqual(response["ETag"], plain["ETag"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_build_is_skipped_when_sources_are_unchanged(self):
+        stdout = io.StringIO()
+        call_command("build_openapi_schema", stdout=stdout)
+        self.assertIn("up to date", stdout.getvalue())
+
+    def test_each_urlconf_gets_its_own_build(self):
+        expected = self.client.get(self.url).json()
+        stdout = io.StringIO()
+        with override_settings(ROOT_URLCONF="customers.api_urls"):
+            call_command("build_openapi_schema", stdout=stdout)
+        self.assertIn("built", stdout.getvalue())
+        self.assertEqual(self.client.get(self.url).json(), expected)
+
+    @override_settings(OPENAPI_SCHEMA_DIR="/nonexistent")
+    def test_renders_in_memory_without_prebuilt_schema(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class JobAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_delete_runs_in_background(self):
+        customers = [
+            Customer.objects.create(name=name, surname="Doe", created_by=self.user)
+            for name in ("Jane", "John", "Jim")
+        ]
+        ids = [customer.pk for customer in customers[:2]]
+        response = self.client.post(
+            reverse("customer-bulk-delete"), {"ids": ids}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Customer.objects.count(), 3)
+
+        jobs.run_pending()
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.data["status"], Job.Status.SUCCEEDED)
+        self.assertEqual(response.data["result"], {"deleted": 2})
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_import(self):
+        data = [
+            {"name": "Alice", "surname": "Smith"},
+            {"name": "Bob", "surname": "Jones"},
+        ]
+        response = self.client.post(reverse("customer-import"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        jobs.run_pending()
+        self.assertEqual(
+            Customer.objects.filter(
+                created_by=self.user, modified_by=self.user
+            ).count(),
+            2,
+        )
+
+    def test_import_enqueues_validated_data(self):
+        data = [{"name": "Alice", "surname": "Smith", "created_at": "2000-01-01"}]
+        response = self.client.post(reverse("customer-import"), data, format="json")
+        job = Job.objects.get(pk=response.data["id"])
+        self.assertEqual(
+            job.payload, {"customers": [{"name": "Alice", "surname": "Smith"}]}
+        )
+
+    def test_invalid_import_is_rejected_up_front(self):
+        url = reverse("customer-import")
+        response = self.client.post(url, [{"name": "Alice"}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, [], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {"name": "Alice", "surname": "Smith"})
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertFalse(Job.objects.exists())
+
+    def test_invalid_payload_is_not_retried(self):
+        job = jobs.enqueue("customers.import", {"customers": [{}]}, self.user)
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("ValidationError", job.error)
+
+    def test_export(self):
+        exports_root = tempfile.TemporaryDirectory()
+        self.addCleanup(exports_root.cleanup)
+        Customer.objects.create(name="Jane", surname="Doe", created_by=self.user)
+        with override_settings(EXPORTS_ROOT=exports_root.name):
+            response = self.client.post(reverse("customer-export"))
+            job = jobs.run_pending()[0]
+            download = self.client.get(reverse("job-download", kwargs={"pk": job.pk}))
+        lines = b"".join(download.streaming_content).decode().splitlines()
+        self.assertEqual(response.data["id"], job.pk)
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        self.assertEqual(lines[0], "id,name,surname,created_by,created_at,updated_at")
+        self.assertIn("Jane,Doe", lines[1])
+
+        other_user = User.objects.create_user(username="other", password="pass")
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(reverse("job-download", kwargs={"pk": job.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_admin_job_list_is_not_cached(self):
+        admin = User.objects.create_user(
+            username="admin", password="pass", is_admin=True
+        )
+        self.client.force_authenticate(user=admin)
+        jobs.enqueue("customers.export", {}, self.user)
+        self.assertEqual(len(self.client.get(reverse("job-list")).data), 1)
+        jobs.enqueue("customers.export", {}, self.user)
+        self.assertEqual(len(self.client.get(reverse("job-list")).data), 2)
+
+    @override_settings(JOBS={"MAX_ATTEMPTS": 2, "RETRY_DELAY": 10})
+    def test_failed_job_is_retried_with_backoff(self):
+        job = jobs.enqueue("customers.delete", {}, self.user)
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("KeyError", job.error)
+        self.assertGreater(job.run_after, job.started_at)
+        self.assertEqual(jobs.run_pending(), [])
+
+        Job.objects.filter(pk=job.pk).update(run_after=job.started_at)
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_jobs_of_other_users_are_hidden(self):
+        other_user = User.objects.create_user(username="other", password="pass")
+        job = jobs.enqueue("customers.export", {}, other_user)
+        response = self.client.get(reverse("job-detail", kwargs={"pk": job.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class IdempotencyAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.url = reverse("customer-list")
+        self.data = {"name": "Alice", "surname": "Smith"}
+
+    def post(self, key="key-1", url=None, data=None):
+        return self.client.post(
+            url or self.url, data or self.data, HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def record_key(self, key="key-1"):
+        return hashlib.sha256(f"{self.token.key}:{key}".encode()).hexdigest()
+
+    def test_retry_replays_first_response(self):
+        first = self.post()
+        with mock.patch.object(CustomerSerializer, "create") as create:
+            retry = self.post()
+        create.assert_not_called()
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_keys_are_scoped_to_the_token(self):
+        self.post()
+        other_user = User.objects.create_user(username="other", password="pass")
+        other_token = Token.objects.create(user=other_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {other_token.key}")
+        self.post()
+        self.post(key="key-2")
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_key_reused_for_another_request(self):
+        self.post()
+        response = self.post(url=f"{self.url}?source=import")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = self.post(data={"name": "Bob", "surname": "Jones"})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_upload_is_fingerprinted_by_file_content(self):
+        data = {**self.data, "photo": generate_photo_file()}
+        first = self.post(data=data)
+        self.addCleanup(Customer.objects.get().photo.delete)
+        retry = self.post(data={**self.data, "photo": generate_photo_file()})
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.data, first.data)
+
+    def test_validation_error_is_not_stored(self):
+        response = self.post(data={"name": "Alice"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_concurrent_retry_waits_for_in_flight_request(self):
+        first = self.post()
+        record = IdempotencyRecord.objects.get(key=self.record_key())
+
+        # Put the first request back in flight, and let it finish while the
+        # retry is waiting for it.
+        IdempotencyRecord.objects.filter(pk=record.pk).update(
+            status=None, expires_at=None
+        )
+        with mock.patch("customers.idempotency.time.sleep") as sleep:
+            sleep.side_effect = lambda seconds: record.save()
+            retry = self.post()
+        sleep.assert_called_once()
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.client.post(self.url, self.data)
+        self.client.post(self.url, self.data)
+        self.assertEqual(Customer.objects.count(), 2)
+
+    @override_settings(IDEMPOTENCY={"LOCK_TIMEOUT": 0.2, "POLL_INTERVAL": 0})
+    def test_in_flight_request_times_out_with_conflict(self):
+        self.post()
+        # Running for longer than a retry waits does not free the key.
+        IdempotencyRecord.objects.update(
+            status=None,
+            expires_at=None,
+            created_at=timezone.now() - timedelta(seconds=60),
+        )
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Customer.objects.count(), 1)
+        self.assertTrue(IdempotencyRecord.objects.exists())
+
+    def test_stale_in_flight_request_frees_its_key(self):
+        self.post()
+        IdempotencyRecord.objects.update(
+            status=None,
+            expires_at=None,
+            created_at=timezone.now() - timedelta(seconds=601),
+        )
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_response_of_freed_key_is_not_stored(self):
+        create = CustomerSerializer.create
+
+        def create_after_key_was_freed(serializer, validated_data):
+            IdempotencyRecord.objects.all().delete()
+            return create(serializer, validated_data)
+
+        with mock.patch.object(
+            CustomerSerializer, "create", create_after_key_was_freed
+        ):
+            with self.assertLogs("customers.idempotency", "WARNING"):
+                response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_expired_records_are_purged(self):
+        self.post()
+        IdempotencyRecord.objects.update(expires_at=timezone.now())
+        call_command("purge_idempotency_keys", stdout=io.StringIO())
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+
 class UserAPITest(APITestCase):
     def setUp(self):
         self.admin_user = User.objects.create_user(
@@ -135,7 +838,24 @@ class UserAPITest(APITestCase):
         url = reverse("user-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_list_users_by_keyset(self):
+        self.client.force_authenticate(user=self.admin_user)
+        for i in range(3):
+            User.objects.create_user(username=f"user{i}", password="pass")
+        response = self.client.get(reverse("user-list"), {"page_size": 2})
+        self.assertEqual(
+            [user["username"] for user in response.data["results"]],
+            ["admin", "normal"],
+        )
+        self.assertIsNone(response.data["previous"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [user["username"] for user in response.data["results"]],
+            ["user0", "user1"],
+        )
 
     def test_create_user(self):
         self.client.force_authenticate(user=self.admin_user)
@@ -186,3 +906,94 @@ class UserAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.normal_user.refresh_from_db()
         self.assertFalse(self.normal_user.is_admin)
+
+    def test_delete_user_with_login_history(self):
+        EmailAddress.objects.create(
+            user=self.normal_user, email="normal@example.com", verified=True
+        )
+        SocialAccount.objects.create(
+            user=self.normal_user, provider="google", uid="123"
+        )
+        LogEntry.objects.log_action(
+            self.normal_user.pk,
+            ContentType.objects.get_for_model(User).pk,
+            self.admin_user.pk,
+            str(self.admin_user),
+            CHANGE,
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(User.objects.filter(pk=self.normal_user.pk).exists())
+        self.assertFalse(EmailAddress.objects.exists())
+        self.assertFalse(LogEntry.objects.exists())
+
+
+# The test runner is a single process, so its local-memory cache is shared.
+@override_settings(USER_SNAPSHOT_CACHE={"ALLOW_LOCAL_CACHE": True})
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        user_snapshots.clear()
+        self.user = User.objects.create_user(username="testuser", password="pass")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.url = reverse("user-list")
+
+    def test_user_loaded_once(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(len(queries), 0)
+
+    def test_user_change_invalidates_snapshot_on_commit(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.is_admin = True
+            self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_change_during_load_is_not_cached(self):
+        load = TokenAuthentication.authenticate_credentials
+
+        def load_before_change(authentication, key):
+            result = load(authentication, key)
+            User.objects.filter(pk=self.user.pk).update(is_admin=True)
+            invalidate_user(self.user.pk)
+            return result
+
+        with mock.patch.object(
+            TokenAuthentication, "authenticate_credentials", load_before_change
+        ):
+            self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_inactive_user_rejected(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deleted_token_rejected(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(USER_SNAPSHOT_CACHE={"ALLOW_LOCAL_CACHE": True, "TTL": 0})
+    def test_expired_snapshot_reloaded(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertTrue(queries)
+
+    @override_settings(USER_SNAPSHOT_CACHE={})
+    def test_no_snapshots_with_process_local_cache(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertTrue(queries)
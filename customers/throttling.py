@@ -0,0 +1,86 @@
+import math
+import time
+
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket throttle with separate budgets for reads, writes and photo
+    uploads, per client and per route.
+
+    Rates come from ``DEFAULT_THROTTLE_RATES`` under the ``read``, ``write`` and
+    ``upload`` scopes. A rate of ``"120/min"`` is a bucket holding 120 tokens
+    that refills at 2 tokens per second. Each check is a single get/set on the
+    ``throttle`` cache.
+    """
+
+    cache = caches["throttle"]
+    cache_format = "throttle_%(scope)s_%(client)s_%(route)s"
+    durations = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    timer = time.time
+
+    def get_scope(self, request):
+        if request.method in SAFE_METHODS:
+            return "read"
+        # Plain form posts are multipart too; only file uploads count as such.
+        if request.FILES:
+            return "upload"
+        return "write"
+
+    def get_client(self, request):
+        token = getattr(request.auth, "key", None)
+        if token:
+            return f"token:{token}"
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def get_route(self, request, view):
+        match = request.resolver_match
+        if match and match.url_name:
+            return match.url_name
+        return view.__class__.__name__
+
+    def parse_rate(self, rate):
+        """Return ``(capacity, seconds)`` for a rate such as ``"100/min"``."""
+        num, period = rate.split("/")
+        return int(num), self.durations[period[0]]
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        capacity, period = self.parse_rate(rate)
+        refill_rate = capacity / period
+        key = self.cache_format % {
+            "scope": scope,
+            "client": self.get_client(request),
+            "route": self.get_route(request, view),
+        }
+
+        now = self.timer()
+        tokens, updated_at = self.cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # An untouched bucket is full again after one period, so let it expire.
+        self.cache.set(key, (tokens, now), period)
+
+        self.wait_seconds = 0 if allowed else (1 - tokens) / refill_rate
+        # Picked up by RateLimitHeadersMiddleware.
+        request._request.rate_limit = {
+            "limit": capacity,
+            "remaining": math.floor(tokens),
+            "reset": math.ceil((capacity - tokens) / refill_rate),
+        }
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
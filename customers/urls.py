@@ -1,28 +1,20 @@
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
 from rest_framework import permissions
-from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework.authentication import TokenAuthentication
 
-from .views import CustomerViewSet, UserViewSet, GoogleLogin, UserRedirectView
+from .auth_views import GoogleLogin, UserRedirectView
+from .schema import api_info
 
 schema_view = get_schema_view(
-    openapi.Info(
-        title="CRM API",
-        default_version="v1",
-    ),
+    api_info,
     public=True,
     authentication_classes=(TokenAuthentication,),
     permission_classes=(permissions.AllowAny,),
 )
 
-router = DefaultRouter()
-router.register(r"customers", CustomerViewSet)
-router.register(r"users", UserViewSet)
-
 urlpatterns = [
-    path("", include(router.urls)),
+    path("", include("customers.api_urls")),
     path("rest-auth/", include("dj_rest_auth.urls")),
     path("rest-auth/registration/", include("dj_rest_auth.registration.urls")),
     path("rest-auth/google/", GoogleLogin.as_view(), name="google_login"),
@@ -1,22 +1,43 @@
-from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
-from allauth.socialaccount.providers.oauth2.client import OAuth2Client
-from dj_rest_auth.registration.views import SocialLoginView
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.conf import settings
-from django.views.generic import RedirectView
-from rest_framework import viewsets
+import logging
+
+from django.db import DatabaseError
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition, require_safe
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.reverse import reverse
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from .models import Customer, User
+from . import jobs
+from .audit import acting_as, audit_log
+from .idempotency import IdempotencyMixin
+from .models import Customer, CustomerChange, Job, User
+from .openapi import get_document
+from .pagination import CustomerChangePagination, UserCursorPagination
 from .permissions import IsAdminUser
-from .serializers import CustomerSerializer, UserSerializer
+from .renderers import ColumnarJSONRenderer, MessagePackRenderer, msgpack
+from .serializers import (
+    CustomerChangeSerializer,
+    CustomerIdsSerializer,
+    CustomerSerializer,
+    JobSerializer,
+    UserSerializer,
+)
+from .stats import get_stats
+
+logger = logging.getLogger(__name__)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(IdempotencyMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     permission_classes = [IsAdminUser]
     serializer_class = UserSerializer
+    pagination_class = UserCursorPagination
 
     def perform_create(self, serializer):
         user = serializer.save()
@@ -31,26 +52,148 @@ class UserViewSet(viewsets.ModelViewSet):
             user.save()
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(IdempotencyMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser, JSONParser)
+    # Clients pick a compact format with the Accept header or ?format=.
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+    if msgpack is not None:
+        renderer_classes.append(MessagePackRenderer)
 
+    def perform_create(self, serializer):
+        with acting_as(self.request.user):
+            serializer.save()
 
-class UserRedirectView(LoginRequiredMixin, RedirectView):
-    """
-    This view is needed by the dj-rest-auth in order for google login to work.
-    It's a bug.
-    """
+    def perform_update(self, serializer):
+        with acting_as(self.request.user):
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        with acting_as(self.request.user):
+            instance.delete()
+
+    @action(detail=True, methods=["get"])
+    def history(self, request, pk=None):
+        """
+        List the recorded changes of a customer, newest first.
+        History is kept after the customer itself is deleted.
+        """
+        try:
+            customer_id = int(pk)
+        except ValueError:
+            raise NotFound()
+        # Read-your-writes: persist anything still waiting in the buffer. Should
+        # the database be failing, the entries stay buffered for the flusher.
+        try:
+            audit_log.flush()
+        except DatabaseError:
+            logger.exception("Failed to flush customer audit entries")
+        queryset = CustomerChange.objects.filter(customer_id=customer_id)
+        paginator = CustomerChangePagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = CustomerChangeSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def stats(self, request):
+        """
+        Customer totals, per creator and per day of creation, read from
+        precomputed counters.
+        """
+        return Response(get_stats())
+
+    def accepted(self, job):
+        """Answer 202 Accepted, pointing the client at the job's status."""
+        url = reverse("job-detail", kwargs={"pk": job.pk}, request=self.request)
+        return Response(
+            JobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": url},
+        )
+
+    @action(detail=False, methods=["post"], url_path="bulk-delete")
+    def bulk_delete(self, request):
+        """Delete the customers with the given `ids` in the background."""
+        serializer = CustomerIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = jobs.enqueue("customers.delete", serializer.data, request.user)
+        return self.accepted(job)
 
-    permanent = False
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        url_name="import",
+        parser_classes=[JSONParser],
+    )
+    def import_customers(self, request):
+        """Create the posted JSON list of customers in the background."""
+        serializer = self.get_serializer(
+            data=request.data, many=True, allow_empty=False
+        )
+        serializer.is_valid(raise_exception=True)
+        job = jobs.enqueue(
+            "customers.import",
+            {"customers": serializer.validated_data},
+            request.user,
+        )
+        return self.accepted(job)
 
-    def get_redirect_url(self, *args, **kwargs):
-        return "redirect-url"
+    @action(detail=False, methods=["post"])
+    def export(self, request):
+        """Export all customers to a CSV file in the background."""
+        job = jobs.enqueue("customers.export", {}, request.user)
+        return self.accepted(job)
 
 
-class GoogleLogin(SocialLoginView):
-    adapter_class = GoogleOAuth2Adapter
-    client_class = OAuth2Client
-    callback_url = settings.GOOGLE_REDIRECT_URL
+class JobViewSet(
+    mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
+    """Status of the background jobs started by the current user."""
+
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, "swagger_fake_view", False):
+            return Job.objects.none()
+        if self.request.user.is_admin:
+            return super().get_queryset()
+        return super().get_queryset().filter(created_by=self.request.user)
+
+    @action(detail=True, methods=["get"])
+    def download(self, request, pk=None):
+        """Download the file written by a finished export."""
+        job = self.get_object()
+        if job.status != Job.Status.SUCCEEDED or not (job.result or {}).get("file"):
+            raise NotFound("This job has no file to download.")
+        storage = jobs.export_storage()
+        name = job.result["file"]
+        if not storage.exists(name):
+            raise NotFound("The file is no longer available.")
+        return FileResponse(storage.open(name), as_attachment=True, filename=name)
+
+
+def schema_etag(request, format):
+    document = get_document(format)
+    accept_encoding = request.headers.get("Accept-Encoding", "")
+    return f"{document.etag}-{document.negotiate(accept_encoding)}"
+
+
+@require_safe
+@condition(etag_func=schema_etag)
+def openapi_schema(request, format):
+    """
+    Serve the OpenAPI document prebuilt by ``manage.py build_openapi_schema``,
+    precompressed with the best content coding the client accepts.
+    """
+    document = get_document(format)
+    coding = document.negotiate(request.headers.get("Accept-Encoding", ""))
+    response = HttpResponse(document.bodies[coding], content_type=document.content_type)
+    if coding != "identity":
+        response["Content-Encoding"] = coding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
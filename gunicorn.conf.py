@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration, picked up automatically by ``gunicorn crm_api.wsgi``.
+
+With ``preload_app`` the application is imported once in the master process and
+the workers are forked from it, so they share the loaded code copy-on-write
+instead of each importing it again.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+preload_app = int(os.getenv("GUNICORN_PRELOAD", 1)) == 1
+
+
+def when_ready(server):
+    """Finish loading the application in the master before workers fork."""
+    if not server.cfg.preload_app:
+        return
+
+    from django.db import connections
+    from django.urls import get_resolver
+
+    # Django imports the URLconf, and with it every view and serializer, on
+    # the first request; do it here so those pages are shared as well.
+    get_resolver().reverse_dict
+    # Connections must not be inherited by the forked workers.
+    connections.close_all()